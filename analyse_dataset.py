@@ -8,13 +8,18 @@ and common/distinctive words for each label.
 This file is intended for quick, human-readable dataset insights.
 """
 
-import json
-from collections import Counter
-from feature_extraction import FeatureExtractor
+from streaming_stats import analyze_file, analyze_files
 
 
-def analyze_dataset():
-    """Load `dataset.json` and print a series of summary statistics.
+def analyze_dataset(filepaths='dataset.json', approximate=False, processes=None):
+    """Analyse one or more dataset files and print a series of summary statistics.
+
+    Every record is read and tokenized exactly once; a corpus cache
+    directory (see `corpus_cache.py`) can be given instead of a JSON file to
+    skip tokenization altogether. Passing a list of shard
+    paths analyses them in parallel and merges the partial results;
+    `approximate=True` swaps exact counters for fixed-size sketches so memory
+    stays bounded on large corpora.
 
     Sections printed:
     - Class distribution
@@ -22,19 +27,14 @@ def analyze_dataset():
     - Document length statistics
     - Top words per class and some sample documents
     """
-    # Load dataset from disk
-    with open('dataset.json', 'r') as f:
-        data = json.load(f)
-
-    # Separate texts by label for class-specific analysis
-    sports_texts = []
-    politics_texts = []
+    if isinstance(filepaths, str):
+        stats = analyze_file(filepaths, approximate)
+    else:
+        stats = analyze_files(filepaths, approximate, processes)
 
-    for item in data:
-        if item['label'] == 'sports':
-            sports_texts.append(item['text'])
-        else:
-            politics_texts.append(item['text'])
+    sports = stats.get('sports')
+    politics = stats.get('politics')
+    total = stats.total
 
     # Header
     print("=" * 60)
@@ -43,83 +43,49 @@ def analyze_dataset():
 
     # 1) Class distribution
     print("\n1. CLASS DISTRIBUTION")
-    print(f"Total samples: {len(data)}")
-    print(f"Sports samples: {len(sports_texts)}")
-    print(f"Politics samples: {len(politics_texts)}")
-    print(f"Balance: {len(sports_texts) / len(data) * 100:.1f}% sports, {len(politics_texts) / len(data) * 100:.1f}% politics")
-
-    # Build vocabulary using the shared FeatureExtractor utilities
-    extractor = FeatureExtractor()
-    extractor.build_vocabulary(sports_texts + politics_texts)
+    print(f"Total samples: {total}")
+    print(f"Sports samples: {sports.documents}")
+    print(f"Politics samples: {politics.documents}")
+    print(f"Balance: {sports.documents / total * 100:.1f}% sports, {politics.documents / total * 100:.1f}% politics")
 
     # 2) Vocabulary stats
+    vocab_size, sports_only, politics_only, common = stats.vocabulary_overlap('sports', 'politics')
     print("\n2. VOCABULARY")
-    print(f"Total unique words: {len(extractor.vocabulary)}")
-
-    sports_words = set()
-    politics_words = set()
-
-    for text in sports_texts:
-        tokens = extractor.tokenize(text)
-        sports_words.update(tokens)
-
-    for text in politics_texts:
-        tokens = extractor.tokenize(text)
-        politics_words.update(tokens)
-
-    sports_only = sports_words - politics_words
-    politics_only = politics_words - sports_words
-    common = sports_words.intersection(politics_words)
-
-    print(f"Sports-only words: {len(sports_only)}")
-    print(f"Politics-only words: {len(politics_only)}")
-    print(f"Common words: {len(common)}")
+    print(f"Total unique words: {vocab_size}")
+    print(f"Sports-only words: {sports_only}")
+    print(f"Politics-only words: {politics_only}")
+    print(f"Common words: {common}")
 
     # 3) Document length statistics
     print("\n3. DOCUMENT LENGTH")
-    sports_lengths = [len(extractor.tokenize(t)) for t in sports_texts]
-    politics_lengths = [len(extractor.tokenize(t)) for t in politics_texts]
-
-    print(f"Sports - Avg: {sum(sports_lengths) / len(sports_lengths):.1f} words, Min: {min(sports_lengths)}, Max: {max(sports_lengths)}")
-    print(f"Politics - Avg: {sum(politics_lengths) / len(politics_lengths):.1f} words, Min: {min(politics_lengths)}, Max: {max(politics_lengths)}")
+    print(f"Sports - Avg: {sports.average_length():.1f} words, Min: {sports.min_length}, Max: {sports.max_length}")
+    print(f"Politics - Avg: {politics.average_length():.1f} words, Min: {politics.min_length}, Max: {politics.max_length}")
 
     # 4/5) Top words per class
     print("\n4. TOP SPORTS WORDS")
-    sports_word_freq = Counter()
-    for text in sports_texts:
-        tokens = extractor.tokenize(text)
-        sports_word_freq.update(tokens)
-
-    for word, count in sports_word_freq.most_common(15):
+    for word, count in stats.top_words('sports', 15):
         print(f"  {word}: {count}")
 
     print("\n5. TOP POLITICS WORDS")
-    politics_word_freq = Counter()
-    for text in politics_texts:
-        tokens = extractor.tokenize(text)
-        politics_word_freq.update(tokens)
-
-    for word, count in politics_word_freq.most_common(15):
+    for word, count in stats.top_words('politics', 15):
         print(f"  {word}: {count}")
 
     # 6/7) Distinctive words for each class (occurring at least 3 times)
     print("\n6. DISTINCTIVE SPORTS WORDS (sports only)")
-    sports_distinctive = [w for w in sports_only if sports_word_freq[w] >= 3]
-    print(f"  {', '.join(sorted(sports_distinctive)[:20])}")
+    print(f"  {', '.join(stats.distinctive_words('sports', 'politics'))}")
 
     print("\n7. DISTINCTIVE POLITICS WORDS (politics only)")
-    politics_distinctive = [w for w in politics_only if politics_word_freq[w] >= 3]
-    print(f"  {', '.join(sorted(politics_distinctive)[:20])}")
+    print(f"  {', '.join(stats.distinctive_words('politics', 'sports'))}")
 
     # 8) Print example documents for quick inspection
     print("\n8. SAMPLE DOCUMENTS")
     print("\nSports example:")
-    print(f"  {sports_texts[0]}")
+    print(f"  {sports.sample}")
     print("\nPolitics example:")
-    print(f"  {politics_texts[0]}")
+    print(f"  {politics.sample}")
 
     print("\n" + "=" * 60)
 
 
 if __name__ == '__main__':
-    analyze_dataset()
\ No newline at end of file
+    analyze_dataset()
@@ -0,0 +1,137 @@
+"""
+cascade.py
+----------
+Confidence-based two-stage classifier for cheaper inference. Every text is
+scored by a fast model (e.g. MultinomialNB); only texts whose top class
+probability falls below `threshold` are escalated to the expensive model
+(e.g. RandomForest). Helpers calibrate the threshold on held-out data and
+report escalation rate, latency and accuracy against either model alone.
+"""
+
+import time
+
+import numpy as np
+from sklearn.metrics import accuracy_score
+
+
+DEFAULT_THRESHOLDS = [0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 0.99, 1.0]
+
+
+class CascadeClassifier:
+    """Route low-confidence predictions of `fast` to `slow`.
+
+    `fast` must implement `predict_proba`. Both models must be trained on
+    the same feature space and labels.
+    """
+
+    def __init__(self, fast, slow, threshold=0.9):
+        self.fast = fast
+        self.slow = slow
+        self.threshold = threshold
+
+    def fit(self, X, y, sample_weight=None):
+        self.fast.fit(X, y, sample_weight=sample_weight)
+        self.slow.fit(X, y, sample_weight=sample_weight)
+        return self
+
+    def predict_with_escalation(self, X):
+        """Return `(predictions, escalated)` where `escalated` is a boolean mask
+        of the rows that were sent to the slow model."""
+        X = np.asarray(X)
+        probabilities = self.fast.predict_proba(X)
+        predictions = self.fast.classes_[probabilities.argmax(axis=1)]
+        escalated = probabilities.max(axis=1) < self.threshold
+        if escalated.any():
+            predictions = predictions.copy()
+            predictions[escalated] = self.slow.predict(X[escalated])
+        return predictions, escalated
+
+    def predict(self, X):
+        return self.predict_with_escalation(X)[0]
+
+
+def calibrate_threshold(cascade, X_val, y_val, thresholds=None, tolerance=0.0,
+                        sample_weight=None):
+    """Pick the cheapest threshold whose accuracy is within `tolerance` of the
+    slow model on validation data, and set it on `cascade`.
+
+    Both models score the validation set once and every candidate threshold
+    is evaluated from those scores. `sample_weight` (e.g. duplicate counts)
+    weights accuracy and escalation rate by traffic rather than by unique
+    row. Returns `(threshold, table)` where `table` lists the accuracy and
+    escalation rate of each candidate.
+    """
+    thresholds = sorted(thresholds or DEFAULT_THRESHOLDS)
+    X_val = np.asarray(X_val)
+    y_val = np.asarray(y_val)
+
+    probabilities = cascade.fast.predict_proba(X_val)
+    fast_predictions = cascade.fast.classes_[probabilities.argmax(axis=1)]
+    confidence = probabilities.max(axis=1)
+    slow_predictions = cascade.slow.predict(X_val)
+    slow_accuracy = accuracy_score(y_val, slow_predictions, sample_weight=sample_weight)
+
+    table = []
+    chosen = None
+    for threshold in thresholds:
+        escalated = confidence < threshold
+        predictions = np.where(escalated, slow_predictions, fast_predictions)
+        accuracy = accuracy_score(y_val, predictions, sample_weight=sample_weight)
+        table.append({
+            'threshold': threshold,
+            'accuracy': accuracy,
+            'escalation_rate': float(np.average(escalated, weights=sample_weight))
+        })
+        # Thresholds are ascending, so the first acceptable one escalates least
+        if chosen is None and accuracy >= slow_accuracy - tolerance:
+            chosen = threshold
+
+    if chosen is None:
+        chosen = thresholds[-1]
+    cascade.threshold = chosen
+    return chosen, table
+
+
+def _timed_predict(predict, X, repeat):
+    """Return the result of `predict(X)` and its best wall time over `repeat` runs."""
+    best = None
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        result = predict(X)
+        elapsed = time.perf_counter() - start_time
+        if best is None or elapsed < best:
+            best = elapsed
+    return result, best
+
+
+def evaluate_cascade(cascade, X_test, y_test, repeat=5):
+    """Compare the cascade against its fast and slow models on test data.
+
+    Returns a dict with accuracy and end-to-end latency (total seconds and
+    milliseconds per sample) for each of `fast`, `slow` and `cascade`, plus
+    the share of traffic escalated to the slow model. Latencies are the best
+    of `repeat` runs so that the three can be compared despite timer noise.
+    """
+    X_test = np.asarray(X_test)
+    n = len(X_test)
+
+    fast_predictions, fast_time = _timed_predict(cascade.fast.predict, X_test, repeat)
+    slow_predictions, slow_time = _timed_predict(cascade.slow.predict, X_test, repeat)
+    (predictions, escalated), cascade_time = _timed_predict(
+        cascade.predict_with_escalation, X_test, repeat)
+
+    report = {
+        'threshold': cascade.threshold,
+        'escalation_rate': float(escalated.mean()) if n else 0.0,
+        'escalated_samples': int(escalated.sum())
+    }
+    for name, preds, elapsed in (('fast', fast_predictions, fast_time),
+                                 ('slow', slow_predictions, slow_time),
+                                 ('cascade', predictions, cascade_time)):
+        report[name] = {
+            'accuracy': accuracy_score(y_test, preds),
+            'latency': elapsed,
+            'latency_per_sample_ms': elapsed / n * 1000 if n else 0.0
+        }
+    report['predictions'] = predictions
+    return report
@@ -5,38 +5,76 @@ Run experiments comparing multiple classifiers and feature extraction
 approaches. Outputs evaluation metrics and saves results to `results.json`.
 """
 
-from feature_extraction import FeatureExtractor, load_dataset, split_data
+from feature_extraction import FeatureExtractor, split_data
+from corpus_cache import load_corpus
+from deduplication import deduplicate, split_overlap
+from cascade import CascadeClassifier, calibrate_threshold, evaluate_cascade
 from sklearn.naive_bayes import MultinomialNB
 from sklearn.tree import DecisionTreeClassifier
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, confusion_matrix
+from sklearn.base import clone
+from streaming_metrics import StreamingMetrics
 import json
 import time
 
 
 def evaluate_model(y_true, y_pred):
-    """Compute common evaluation metrics and return them in a dict."""
-    accuracy = accuracy_score(y_true, y_pred)
-    precision = precision_score(y_true, y_pred, average='weighted')
-    recall = recall_score(y_true, y_pred, average='weighted')
-    f1 = f1_score(y_true, y_pred, average='weighted')
-    cm = confusion_matrix(y_true, y_pred)
-
-    return {
-        'accuracy': accuracy,
-        'precision': precision,
-        'recall': recall,
-        'f1_score': f1,
-        'confusion_matrix': cm.tolist()
-    }
+    """Compute common evaluation metrics and return them in a dict.
+
+    All metrics are derived from one confusion matrix built in a single pass;
+    use `StreamingMetrics` directly to evaluate in batches.
+    """
+    return StreamingMetrics().update(y_true, y_pred).result()
+
+
+def run_cascade(fast, slow, train_features, train_labels, test_features, test_labels,
+                sample_weight=None, calibration_ratio=0.2):
+    """Build a cascade from the already fitted `fast` and `slow` classifiers,
+    calibrate its confidence threshold on the last `calibration_ratio` of
+    the training rows and evaluate it on the test set.
+
+    Calibration uses unfitted copies of both models trained on the remaining
+    rows; the evaluated cascade reuses `fast` and `slow` themselves, so its
+    baselines are the same models as the `Naive Bayes` and `Random Forest`
+    entries of `run_experiments`.
+
+    Returns the usual `evaluate_model` metrics for the cascade plus its
+    threshold, escalation rate, latency and the accuracy of either model
+    alone.
+    """
+    fit_size = int(len(train_features) * (1 - calibration_ratio))
+    fit_weight = None
+    calibration_weight = None
+    if sample_weight is not None:
+        fit_weight = sample_weight[:fit_size]
+        calibration_weight = sample_weight[fit_size:]
+
+    calibration = CascadeClassifier(clone(fast), clone(slow))
+    calibration.fit(train_features[:fit_size], train_labels[:fit_size], sample_weight=fit_weight)
+    threshold, _ = calibrate_threshold(calibration, train_features[fit_size:], train_labels[fit_size:],
+                                       sample_weight=calibration_weight)
 
+    cascade = CascadeClassifier(fast, slow, threshold)
 
-def run_experiments():
+    report = evaluate_cascade(cascade, test_features, test_labels)
+    metrics = evaluate_model(test_labels, report.pop('predictions'))
+    metrics.update(report)
+    return metrics
+
+
+def run_experiments(dedup=True):
     """Load data, extract features with multiple methods, train classifiers,
     collect metrics and save a JSON summary to disk.
+
+    With `dedup` enabled, duplicate training documents (identical after
+    tokenization) are collapsed into unique rows and their counts are passed
+    to the classifiers as `sample_weight`, so training cost scales with the
+    amount of unique content rather than raw volume.
     """
+    # Tokenized documents come from the on-disk corpus cache, rebuilt only
+    # when dataset.json changes
     print("Loading dataset...")
-    texts, labels = load_dataset('dataset.json')
+    texts, labels = load_corpus('dataset.json')
 
     # Simple chronological split used for reproducibility in examples
     print("Splitting data...")
@@ -47,14 +85,25 @@ def run_experiments():
 
     # Setup feature extractor and precompute vocabularies
     extractor = FeatureExtractor()
+
+    sample_weight = None
+    if dedup:
+        overlap = split_overlap(train_texts, test_texts, extractor)
+        train_texts, train_labels, sample_weight = deduplicate(train_texts, train_labels, extractor)
+        print("Unique training samples:", len(train_texts))
+        print("Test samples duplicated in training: {} of {} ({} unique documents)".format(
+            overlap['test_duplicates'], overlap['test_documents'], overlap['unique_shared']))
+
     extractor.build_vocabulary(train_texts)
     extractor.build_ngram_vocabulary(train_texts, 2)
 
-    # Different feature extraction approaches to compare
+    # Different feature extraction approaches to compare. Each takes the
+    # documents and their duplicate counts (None for the test split) so
+    # corpus statistics such as IDF match the non-deduplicated corpus.
     feature_methods = {
-        'bag_of_words': extractor.bag_of_words,
+        'bag_of_words': lambda docs, weights: extractor.bag_of_words(docs),
         'tfidf': extractor.tfidf,
-        'bigrams': lambda docs: extractor.ngram_features(docs, 2)
+        'bigrams': lambda docs, weights: extractor.ngram_features(docs, 2)
     }
 
     # Classifiers under comparison
@@ -73,8 +122,8 @@ def run_experiments():
 
         # Measure time for feature extraction
         start_time = time.time()
-        train_features = feature_func(train_texts)
-        test_features = feature_func(test_texts)
+        train_features = feature_func(train_texts, sample_weight)
+        test_features = feature_func(test_texts, None)
         feature_time = time.time() - start_time
 
         print("Feature extraction time: {:.2f} seconds".format(feature_time))
@@ -86,7 +135,7 @@ def run_experiments():
             print("\n  Classifier:", clf_name)
 
             start_time = time.time()
-            classifier.fit(train_features, train_labels)
+            classifier.fit(train_features, train_labels, sample_weight=sample_weight)
             train_time = time.time() - start_time
 
             predictions = classifier.predict(test_features)
@@ -103,6 +152,20 @@ def run_experiments():
 
             results[feature_name][clf_name] = metrics
 
+        # Serve with the cheap model and escalate only uncertain texts
+        print("\n  Cascade: Naive Bayes -> Random Forest")
+        metrics = run_cascade(classifiers['Naive Bayes'], classifiers['Random Forest'],
+                              train_features, train_labels, test_features, test_labels, sample_weight)
+        metrics['feature_extraction_time'] = feature_time
+
+        print("    Threshold: {:.2f}".format(metrics['threshold']))
+        print("    Escalated: {:.1%} of test samples".format(metrics['escalation_rate']))
+        for stage in ('fast', 'slow', 'cascade'):
+            print("    {:<8} Accuracy: {:.4f}  Latency: {:.4f} ms/sample".format(
+                stage.title() + ':', metrics[stage]['accuracy'], metrics[stage]['latency_per_sample_ms']))
+
+        results[feature_name]['Cascade'] = metrics
+
     # Save aggregated results for visualization and later analysis
     with open('results.json', 'w') as f:
         json.dump(results, f, indent=2)
@@ -0,0 +1,245 @@
+"""
+corpus_cache.py
+---------------
+Tokenize a dataset once and store it on disk as a term dictionary plus flat
+int32 arrays of token ids, per-document offsets and label ids. The arrays
+are opened with `numpy` memory mapping, so repeat experiments skip JSON
+parsing and tokenization entirely and several processes reading the same
+cache share the same pages.
+
+Layout of a cache directory:
+- `terms.json`: list of terms, indexed by token id
+- `label_names.json`: list of labels, indexed by label id
+- `tokens.npy`: token ids of all documents, concatenated
+- `offsets.npy`: document `i` spans `tokens[offsets[i]:offsets[i + 1]]`
+- `labels.npy`: label id of each document
+- `source.json`: path, size and mtime of the dataset the cache was built
+  from, plus the cache format version and the tokenizer that built it
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from array import array
+
+import numpy as np
+
+from feature_extraction import FeatureExtractor, iter_dataset
+
+
+# Bump when the on-disk layout changes so old caches are rebuilt
+CACHE_FORMAT_VERSION = 1
+
+
+def _tokenizer_id(extractor):
+    """Identify the tokenizer by its class and a digest of its bytecode, so
+    a cache built with a different or modified `tokenize` is not reused."""
+    cls = type(extractor)
+    code = cls.tokenize.__code__
+    digest = hashlib.sha1(code.co_code + repr((code.co_consts, code.co_names)).encode('utf-8'))
+    return '{}.{}:{}'.format(cls.__module__, cls.__qualname__, digest.hexdigest()[:16])
+
+
+def _source_info(json_path, extractor):
+    stat = os.stat(json_path)
+    return {
+        'path': os.path.abspath(json_path),
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+        'format': CACHE_FORMAT_VERSION,
+        'tokenizer': _tokenizer_id(extractor)
+    }
+
+
+def _publish(build_dir, cache_dir):
+    """Move the finished `build_dir` into place as `cache_dir`.
+
+    `os.replace` cannot overwrite a non-empty directory, so an existing
+    cache is first renamed aside and removed once the new one is in place.
+    Processes that already memory-mapped the old files keep their mappings.
+    """
+    parent = os.path.dirname(os.path.abspath(cache_dir))
+    old_dir = None
+    if os.path.exists(cache_dir):
+        old_dir = tempfile.mkdtemp(prefix='.old-', dir=parent)
+        try:
+            os.replace(cache_dir, os.path.join(old_dir, 'cache'))
+        except FileNotFoundError:
+            pass  # another process moved it first
+
+    try:
+        os.replace(build_dir, cache_dir)
+    except OSError:
+        # Another process published its cache in between; use that one
+        shutil.rmtree(build_dir, ignore_errors=True)
+    finally:
+        if old_dir is not None:
+            shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def build_corpus_cache(json_path, cache_dir, extractor=None):
+    """Tokenize `json_path` in one streaming pass and write the cache to `cache_dir`.
+
+    The cache is written to a temporary sibling directory and renamed into
+    place when complete, so concurrent readers never map a half-written
+    array and concurrent builders do not overwrite each other's files.
+    """
+    extractor = extractor or FeatureExtractor()
+    term_ids = {}
+    label_ids = {}
+    tokens = array('i')
+    offsets = array('i', [0])
+    labels = array('i')
+
+    for record in iter_dataset(json_path):
+        for term in extractor.tokenize(record['text']):
+            if term not in term_ids:
+                term_ids[term] = len(term_ids)
+            tokens.append(term_ids[term])
+        offsets.append(len(tokens))
+
+        label = record['label']
+        if label not in label_ids:
+            label_ids[label] = len(label_ids)
+        labels.append(label_ids[label])
+
+    parent = os.path.dirname(os.path.abspath(cache_dir))
+    os.makedirs(parent, exist_ok=True)
+    build_dir = tempfile.mkdtemp(prefix='.build-', dir=parent)
+    try:
+        # mkdtemp creates the directory private to this user
+        os.chmod(build_dir, 0o755)
+        np.save(os.path.join(build_dir, 'tokens.npy'), np.frombuffer(tokens, dtype=np.int32))
+        np.save(os.path.join(build_dir, 'offsets.npy'), np.frombuffer(offsets, dtype=np.int32))
+        np.save(os.path.join(build_dir, 'labels.npy'), np.frombuffer(labels, dtype=np.int32))
+
+        with open(os.path.join(build_dir, 'terms.json'), 'w') as f:
+            json.dump(list(term_ids), f)
+        with open(os.path.join(build_dir, 'label_names.json'), 'w') as f:
+            json.dump(list(label_ids), f)
+        with open(os.path.join(build_dir, 'source.json'), 'w') as f:
+            json.dump(_source_info(json_path, extractor), f)
+    except BaseException:
+        shutil.rmtree(build_dir, ignore_errors=True)
+        raise
+
+    _publish(build_dir, cache_dir)
+    return CorpusCache(cache_dir)
+
+
+def _read_source(cache_dir):
+    with open(os.path.join(cache_dir, 'source.json'), 'r') as f:
+        return json.load(f)
+
+
+def is_cache_fresh(json_path, cache_dir, extractor=None):
+    """Return True if `cache_dir` holds a cache built from the current
+    `json_path` with the same cache format and tokenizer as `extractor`."""
+    try:
+        source = _read_source(cache_dir)
+    except (OSError, ValueError):
+        return False
+    return source == _source_info(json_path, extractor or FeatureExtractor())
+
+
+class TokenizedDocuments:
+    """Read-only sequence of tokenized documents backed by a `CorpusCache`.
+
+    Indexing returns a list of term strings (shared with the cache's term
+    dictionary); slicing returns another view without copying any arrays.
+    `FeatureExtractor` methods accept these views in place of raw texts.
+    """
+
+    def __init__(self, cache, start=0, stop=None):
+        self.cache = cache
+        self.start = start
+        self.stop = len(cache) if stop is None else stop
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                raise ValueError("TokenizedDocuments only supports contiguous slices")
+            return TokenizedDocuments(self.cache, self.start + start, self.start + max(start, stop))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("document index out of range")
+        return self.cache.document_tokens(self.start + index)
+
+    def __iter__(self):
+        for i in range(self.start, self.stop):
+            yield self.cache.document_tokens(i)
+
+
+class CorpusCache:
+    """Memory-mapped view of a corpus cache written by `build_corpus_cache`.
+
+    Attributes
+    - `source`: contents of `source.json`, read before any other file
+    - `terms`: list mapping token id -> term
+    - `label_names`: list mapping label id -> label
+    - `tokens`, `offsets`, `label_ids`: read-only memory-mapped int32 arrays
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.source = _read_source(cache_dir)
+        with open(os.path.join(cache_dir, 'terms.json'), 'r') as f:
+            self.terms = json.load(f)
+        with open(os.path.join(cache_dir, 'label_names.json'), 'r') as f:
+            self.label_names = json.load(f)
+        self.tokens = np.load(os.path.join(cache_dir, 'tokens.npy'), mmap_mode='r')
+        self.offsets = np.load(os.path.join(cache_dir, 'offsets.npy'), mmap_mode='r')
+        self.label_ids = np.load(os.path.join(cache_dir, 'labels.npy'), mmap_mode='r')
+
+    def __len__(self):
+        return len(self.label_ids)
+
+    def document_ids(self, i):
+        """Return the token ids of document `i` as a zero-copy array slice."""
+        return self.tokens[self.offsets[i]:self.offsets[i + 1]]
+
+    def document_tokens(self, i):
+        """Return the terms of document `i`."""
+        terms = self.terms
+        return [terms[t] for t in self.document_ids(i).tolist()]
+
+    def documents(self):
+        return TokenizedDocuments(self)
+
+    def labels(self):
+        names = self.label_names
+        return [names[l] for l in self.label_ids.tolist()]
+
+
+def load_corpus(json_path, cache_dir='corpus_cache', retries=5, extractor=None):
+    """Return `(documents, labels)` for `json_path`, served from the corpus cache.
+
+    The cache is (re)built when it is missing, when the dataset's path, size
+    or mtime differ from the ones it was built from, or when it was built
+    with a different cache format or tokenizer than `extractor`'s.
+    `documents` is a `TokenizedDocuments` view and can be passed wherever
+    `FeatureExtractor` expects a list of texts, including `split_data`.
+
+    Another process may swap in a rebuilt cache while this one is opening
+    its files. Builds of the same source are identical, so the open is
+    retried only if a file disappeared or `source.json` changed meanwhile.
+    """
+    for attempt in range(retries):
+        try:
+            if is_cache_fresh(json_path, cache_dir, extractor):
+                cache = CorpusCache(cache_dir)
+            else:
+                cache = build_corpus_cache(json_path, cache_dir, extractor)
+            if _read_source(cache_dir) == cache.source:
+                return cache.documents(), cache.labels()
+        except OSError:
+            if attempt == retries - 1:
+                raise
+    raise OSError("corpus cache {} kept changing while being opened".format(cache_dir))
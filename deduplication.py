@@ -0,0 +1,76 @@
+"""
+deduplication.py
+----------------
+Collapse duplicate documents into unique rows with occurrence counts so
+classifiers can be trained on unique content with `sample_weight` instead of
+on every syndicated copy. Also reports how many duplicates cross a
+train/test split, since those inflate test scores.
+"""
+
+from collections import OrderedDict
+
+
+def document_key(text, extractor=None):
+    """Return the key used to decide whether two documents are duplicates.
+
+    Without an `extractor` documents must match exactly; with one they are
+    compared after tokenization, so case and punctuation differences are
+    ignored. Already tokenized documents (see `corpus_cache`) are compared
+    by their terms.
+    """
+    if extractor is None:
+        return text if isinstance(text, str) else " ".join(text)
+    return " ".join(extractor.document_tokens(text))
+
+
+def deduplicate(texts, labels, extractor=None):
+    """Collapse duplicate `(document, label)` pairs into unique rows.
+
+    Returns `(unique_texts, unique_labels, counts)` where `counts[i]` is the
+    number of times row `i` occurred. The first occurrence of each document
+    is kept as its representative text and input order is preserved.
+    Identical documents with different labels stay as separate rows so the
+    weights still reflect the label noise in the data.
+    """
+    rows = OrderedDict()
+    for text, label in zip(texts, labels):
+        key = (document_key(text, extractor), label)
+        if key in rows:
+            rows[key][1] += 1
+        else:
+            rows[key] = [text, 1]
+
+    unique_texts = []
+    unique_labels = []
+    counts = []
+    for (_, label), (text, count) in rows.items():
+        unique_texts.append(text)
+        unique_labels.append(label)
+        counts.append(count)
+
+    return unique_texts, unique_labels, counts
+
+
+def split_overlap(train_texts, test_texts, extractor=None):
+    """Report how many test documents also occur in the training split.
+
+    Returns a dict with:
+    - `test_documents`: total number of test documents
+    - `test_duplicates`: test documents whose key also appears in training
+    - `unique_shared`: number of distinct keys present in both splits
+    """
+    train_keys = set(document_key(text, extractor) for text in train_texts)
+
+    test_duplicates = 0
+    shared = set()
+    for text in test_texts:
+        key = document_key(text, extractor)
+        if key in train_keys:
+            test_duplicates += 1
+            shared.add(key)
+
+    return {
+        'test_documents': len(test_texts),
+        'test_duplicates': test_duplicates,
+        'unique_shared': len(shared)
+    }
@@ -6,7 +6,8 @@ top portion of `dataset.json` and allows a user to type sentences to see the
 predicted label and class probabilities.
 """
 
-from feature_extraction import FeatureExtractor, load_dataset, split_data
+from feature_extraction import FeatureExtractor, split_data
+from corpus_cache import load_corpus
 from sklearn.naive_bayes import MultinomialNB
 import json
 
@@ -15,7 +16,7 @@ def train_demo_classifier():
     """Train a lightweight classifier on the training split and return the
     classifier along with the extractor used for feature vectorization.
     """
-    texts, labels = load_dataset('dataset.json')
+    texts, labels = load_corpus('dataset.json')
     train_texts, train_labels, _, _ = split_data(texts, labels)
 
     extractor = FeatureExtractor()
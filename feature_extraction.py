@@ -8,8 +8,11 @@ experiments in this repository.
 
 import math
 import json
+import os
 from collections import Counter
 
+from vocab_store import VocabularyStore
+
 
 class FeatureExtractor:
     """Simple feature extraction helper for small text datasets.
@@ -18,6 +21,9 @@ class FeatureExtractor:
     - `vocabulary`: set of tokens collected from training documents
     - `idf_values`: computed IDF values for words (used by `tfidf`)
     - `ngram_vocabulary`: dict mapping n -> sorted list of n-grams
+
+    After `compact()` these are backed by `VocabularyStore` arrays instead
+    of Python objects; lookups work the same but the vocabularies are frozen.
     """
 
     def __init__(self):
@@ -43,80 +49,117 @@ class FeatureExtractor:
                 cleaned.append(word)
         return cleaned
 
+    def document_tokens(self, doc):
+        """Return the tokens of `doc`.
+
+        `doc` is either raw text, which is tokenized, or an already tokenized
+        sequence of terms such as the documents served by `corpus_cache`.
+        """
+        if isinstance(doc, str):
+            return self.tokenize(doc)
+        return list(doc)
+
     def build_vocabulary(self, documents):
         """Populate `self.vocabulary` from an iterable of documents."""
+        if isinstance(self.vocabulary, VocabularyStore):
+            raise RuntimeError("The vocabulary is frozen after compact(); build it before compacting")
         for doc in documents:
-            tokens = self.tokenize(doc)
+            tokens = self.document_tokens(doc)
             for token in tokens:
                 self.vocabulary.add(token)
         return list(self.vocabulary)
 
+    def _vocabulary_index(self, vocab):
+        """Return `(size, find)` where `find(term)` is the column of `term` in
+        the sorted vocabulary `vocab`, or -1 if it is not in the vocabulary.
+
+        A `VocabularyStore` is already sorted and searched in place, so
+        compacted vocabularies are never expanded back into Python strings.
+        """
+        if isinstance(vocab, VocabularyStore):
+            return len(vocab), vocab.find
+        positions = {term: i for i, term in enumerate(sorted(vocab))}
+        return len(positions), lambda term: positions.get(term, -1)
+
+    def _count_vector(self, terms, size, find):
+        """Return a count vector of length `size` for the given terms."""
+        feature_vector = [0] * size
+        for term, count in Counter(terms).items():
+            i = find(term)
+            if i >= 0:
+                feature_vector[i] = count
+        return feature_vector
+
     def bag_of_words(self, documents):
         """Return integer count vectors for each document using the current vocabulary."""
-        vocab = sorted(list(self.vocabulary))
+        size, find = self._vocabulary_index(self.vocabulary)
         features = []
 
         for doc in documents:
-            tokens = self.tokenize(doc)
-            word_count = {}
-            for token in tokens:
-                if token not in word_count:
-                    word_count[token] = 0
-                word_count[token] += 1
-
-            feature_vector = []
-            for word in vocab:
-                if word in word_count:
-                    feature_vector.append(word_count[word])
-                else:
-                    feature_vector.append(0)
-            features.append(feature_vector)
+            tokens = self.document_tokens(doc)
+            features.append(self._count_vector(tokens, size, find))
 
         return features
 
-    def compute_idf(self, documents):
-        """Compute IDF for each word in vocabulary based on provided documents."""
-        vocab = list(self.vocabulary)
-        doc_count = len(documents)
+    def compute_idf(self, documents, weights=None):
+        """Compute IDF for each word in vocabulary based on provided documents.
 
-        for word in vocab:
-            docs_with_word = 0
-            for doc in documents:
-                tokens = self.tokenize(doc)
-                if word in tokens:
-                    docs_with_word += 1
-
-            if docs_with_word > 0:
-                self.idf_values[word] = math.log(doc_count / docs_with_word)
+        `weights` optionally gives the number of occurrences each document
+        stands for (e.g. the counts returned by `deduplication.deduplicate`),
+        so IDF over unique rows matches IDF over the original corpus.
+        """
+        size, find = self._vocabulary_index(self.vocabulary)
+        if weights is None:
+            weights = [1] * len(documents)
+        doc_count = sum(weights)
+
+        # Document frequency per vocabulary column, one pass over documents
+        docs_with_word = [0] * size
+        for doc, weight in zip(documents, weights):
+            for token in set(self.document_tokens(doc)):
+                i = find(token)
+                if i >= 0:
+                    docs_with_word[i] += weight
+
+        idf = []
+        for count in docs_with_word:
+            if count > 0:
+                idf.append(math.log(doc_count / count))
             else:
-                self.idf_values[word] = 0
+                idf.append(0)
 
-    def tfidf(self, documents):
-        """Return TF-IDF feature vectors for `documents` using computed IDF."""
-        vocab = sorted(list(self.vocabulary))
+        if isinstance(self.vocabulary, VocabularyStore):
+            self.vocabulary.set_idf(idf)
+        else:
+            for word in self.vocabulary:
+                self.idf_values[word] = idf[find(word)]
+
+    def tfidf(self, documents, weights=None):
+        """Return TF-IDF feature vectors for `documents` using computed IDF.
+
+        `weights` is passed through to `compute_idf`.
+        """
+        size, find = self._vocabulary_index(self.vocabulary)
         features = []
 
-        self.compute_idf(documents)
+        self.compute_idf(documents, weights)
+        if isinstance(self.vocabulary, VocabularyStore):
+            idf_values = self.vocabulary.idf
+        else:
+            idf_values = [0] * size
+            for word in self.vocabulary:
+                idf_values[find(word)] = self.idf_values.get(word, 0)
 
         for doc in documents:
-            tokens = self.tokenize(doc)
+            tokens = self.document_tokens(doc)
             token_count = len(tokens)
 
-            word_freq = {}
-            for token in tokens:
-                if token not in word_freq:
-                    word_freq[token] = 0
-                word_freq[token] += 1
-
-            feature_vector = []
-            for word in vocab:
-                tf = 0
-                if word in word_freq:
-                    tf = word_freq[word] / token_count
-
-                idf = self.idf_values.get(word, 0)
-                tfidf_value = tf * idf
-                feature_vector.append(tfidf_value)
+            feature_vector = [0.0] * size
+            for word, count in Counter(tokens).items():
+                i = find(word)
+                if i >= 0:
+                    tf = count / token_count
+                    feature_vector[i] = tf * float(idf_values[i])
 
             features.append(feature_vector)
 
@@ -124,7 +167,7 @@ class FeatureExtractor:
 
     def extract_ngrams(self, text, n):
         """Return list of n-gram strings extracted from a single text."""
-        tokens = self.tokenize(text)
+        tokens = self.document_tokens(text)
         ngrams = []
         for i in range(len(tokens) - n + 1):
             ngram = " ".join(tokens[i:i + n])
@@ -144,28 +187,52 @@ class FeatureExtractor:
 
     def ngram_features(self, documents, n):
         """Return count vectors over the cached n-gram vocabulary for each document."""
-        ngram_vocab_sorted = self.ngram_vocabulary.get(n, [])
+        size, find = self._vocabulary_index(self.ngram_vocabulary.get(n, []))
         features = []
 
         for doc in documents:
             ngrams = self.extract_ngrams(doc, n)
-            ngram_count = {}
-            for ng in ngrams:
-                if ng not in ngram_count:
-                    ngram_count[ng] = 0
-                ngram_count[ng] += 1
-
-            feature_vector = []
-            for ng in ngram_vocab_sorted:
-                if ng in ngram_count:
-                    feature_vector.append(ngram_count[ng])
-                else:
-                    feature_vector.append(0)
-
-            features.append(feature_vector)
+            features.append(self._count_vector(ngrams, size, find))
 
         return features
 
+    def compact(self):
+        """Move the vocabulary, IDF values and n-gram vocabularies into
+        array-backed `VocabularyStore`s to cut memory on large n-gram spaces.
+
+        Call this once the vocabularies are built; afterwards they can be
+        looked up (and IDF values recomputed) but not extended.
+        """
+        if not isinstance(self.vocabulary, VocabularyStore):
+            self.vocabulary = VocabularyStore(self.vocabulary, idf=self.idf_values)
+            self.idf_values = self.vocabulary.idf_values()
+        for n, ngrams in self.ngram_vocabulary.items():
+            if not isinstance(ngrams, VocabularyStore):
+                self.ngram_vocabulary[n] = VocabularyStore(ngrams)
+        return self
+
+    def save_vocabulary(self, directory):
+        """Compact the vocabularies and write them to `directory`."""
+        self.compact()
+        self.vocabulary.save(os.path.join(directory, 'vocabulary'))
+        for n, ngrams in self.ngram_vocabulary.items():
+            ngrams.save(os.path.join(directory, 'ngrams_{}'.format(n)))
+
+    def load_vocabulary(self, directory, mmap=True):
+        """Load vocabularies written by `save_vocabulary`.
+
+        With `mmap` the arrays are shared read-only between processes that
+        load the same directory.
+        """
+        self.vocabulary = VocabularyStore.load(os.path.join(directory, 'vocabulary'), mmap)
+        self.idf_values = self.vocabulary.idf_values()
+        self.ngram_vocabulary = {}
+        for name in os.listdir(directory):
+            if name.startswith('ngrams_'):
+                n = int(name[len('ngrams_'):])
+                self.ngram_vocabulary[n] = VocabularyStore.load(os.path.join(directory, name), mmap)
+        return self
+
 
 def load_dataset(filepath):
     """Load a dataset saved as a list of `{'text','label'}` dicts."""
@@ -181,6 +248,44 @@ def load_dataset(filepath):
     return texts, labels
 
 
+def iter_dataset(filepath, chunk_size=1 << 16):
+    """Yield `{'text','label'}` records from `filepath` one at a time.
+
+    Accepts either the JSON array written by `create_dataset.py` or JSON
+    lines. The file is read in chunks, so memory use depends on the size of
+    a single record rather than the size of the whole dataset.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    eof = False
+
+    with open(filepath, 'r') as f:
+        while True:
+            # Skip whitespace and the array punctuation between records
+            while pos < len(buffer) and (buffer[pos].isspace() or buffer[pos] in '[,]'):
+                pos += 1
+
+            if pos < len(buffer):
+                try:
+                    record, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                else:
+                    pos = end
+                    yield record
+                    continue
+            elif eof:
+                return
+
+            chunk = f.read(chunk_size)
+            if not chunk:
+                eof = True
+            buffer = buffer[pos:] + chunk
+            pos = 0
+
+
 def split_data(texts, labels, train_ratio=0.8):
     """Simple split: first `train_ratio` portion for training, rest for testing.
 
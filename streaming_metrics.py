@@ -0,0 +1,99 @@
+"""
+streaming_metrics.py
+--------------------
+Bounded-memory evaluation metrics. `StreamingMetrics` accumulates a
+confusion matrix batch by batch and derives accuracy and weighted
+precision, recall and F1 from it, so arbitrarily large held-out sets (or a
+live traffic sample from the inference path) can be evaluated in a single
+pass with O(classes^2) memory. Results match the sklearn metric functions
+used by `classifier_comparison.evaluate_model` exactly.
+"""
+
+from collections import Counter
+
+import numpy as np
+
+
+class StreamingMetrics:
+    """Incremental confusion matrix with sklearn-compatible summary metrics.
+
+    Call `update` with each batch of true and predicted labels, `merge` to
+    combine accumulators from separate workers, and `result` to get the
+    same dict `evaluate_model` returns.
+    """
+
+    def __init__(self):
+        self.counts = Counter()
+
+    def update(self, y_true, y_pred):
+        """Add a batch of `(true, predicted)` label pairs.
+
+        Raises `ValueError` if the two sequences differ in length.
+        """
+        if len(y_true) != len(y_pred):
+            raise ValueError("Found input variables with inconsistent numbers of samples: "
+                             "[{}, {}]".format(len(y_true), len(y_pred)))
+        self.counts.update(zip(y_true, y_pred))
+        return self
+
+    def merge(self, other):
+        self.counts.update(other.counts)
+        return self
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+    def labels(self):
+        """Sorted labels seen in either the true or the predicted values."""
+        labels = set()
+        for true, pred in self.counts:
+            labels.add(true)
+            labels.add(pred)
+        return sorted(labels)
+
+    def confusion_matrix(self):
+        """Return the confusion matrix with rows = true and columns = predicted
+        labels, both ordered as in `labels()` (the sklearn convention)."""
+        labels = self.labels()
+        index = {label: i for i, label in enumerate(labels)}
+        cm = np.zeros((len(labels), len(labels)), dtype=np.int64)
+        for (true, pred), count in self.counts.items():
+            cm[index[true], index[pred]] += count
+        return cm
+
+    def result(self):
+        """Return accuracy, weighted precision/recall/F1 and the confusion matrix.
+
+        Per-class scores with a zero denominator count as 0, as sklearn does
+        by default. Raises `ValueError` if no predictions have been added.
+        """
+        if not self.counts:
+            raise ValueError("No predictions have been added to StreamingMetrics")
+        cm = self.confusion_matrix()
+        tp_sum = np.diag(cm)
+        pred_sum = cm.sum(axis=0)
+        true_sum = cm.sum(axis=1)
+
+        # Same operations and order as sklearn so results are bit-identical
+        precision = _divide(tp_sum, pred_sum)
+        recall = _divide(tp_sum, true_sum)
+        f_score = _divide(2.0 * tp_sum.astype(np.float64),
+                          1.0 * true_sum.astype(np.float64) + pred_sum.astype(np.float64))
+
+        return {
+            'accuracy': float(np.trace(cm) / cm.sum()),
+            'precision': float(np.average(precision, weights=true_sum)),
+            'recall': float(np.average(recall, weights=true_sum)),
+            'f1_score': float(np.average(f_score, weights=true_sum)),
+            'confusion_matrix': cm.tolist()
+        }
+
+
+def _divide(numerator, denominator):
+    mask = denominator == 0
+    denominator = np.asarray(denominator, dtype=np.float64).copy()
+    denominator[mask] = 1
+    result = np.asarray(numerator, dtype=np.float64) / denominator
+    result[mask] = 0.0
+    return result
@@ -0,0 +1,315 @@
+"""
+streaming_stats.py
+------------------
+Single-pass, mergeable dataset statistics used by `analyse_dataset.py`.
+
+`DatasetStats` tokenizes each record once and updates every section of the
+analysis (class counts, vocabulary, document lengths and word frequencies)
+from those tokens. Partial results built over separate shards can be merged,
+so large corpora can be analysed in parallel with `analyze_files`.
+
+In approximate mode exact Counters and sets are replaced by fixed-size
+sketches: a count-min sketch for word frequencies and HyperLogLog for
+vocabulary size. All hashing is deterministic so sketches built in
+different processes can be merged.
+"""
+
+import hashlib
+import math
+import os
+from collections import Counter
+from multiprocessing import Pool
+
+from corpus_cache import CorpusCache
+from feature_extraction import FeatureExtractor, iter_dataset
+
+
+def _hash64(item):
+    """Return a stable 64-bit hash of a string (unlike the builtin `hash`)."""
+    digest = hashlib.blake2b(item.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+class CountMinSketch:
+    """Approximate frequency table with bounded memory.
+
+    Estimates never undercount; with the default size they overcount by at
+    most ~0.1% of the total count with high probability. A small pool of
+    heavy-hitter candidates is tracked alongside the sketch so the most
+    frequent items can be listed.
+    """
+
+    def __init__(self, width=2048, depth=4, candidates=1000):
+        self.width = width
+        self.depth = depth
+        self.capacity = candidates
+        self.table = [[0] * width for _ in range(depth)]
+        self.candidates = {}
+
+    def _columns(self, item):
+        # Double hashing: derive all row positions from one 64-bit hash
+        h = _hash64(item)
+        h1 = h & 0xFFFFFFFF
+        h2 = (h >> 32) | 1
+        return [(h1 + i * h2) % self.width for i in range(self.depth)]
+
+    def add(self, item, count=1):
+        estimate = None
+        for row, col in zip(self.table, self._columns(item)):
+            row[col] += count
+            if estimate is None or row[col] < estimate:
+                estimate = row[col]
+        self.candidates[item] = estimate
+        if len(self.candidates) > 2 * self.capacity:
+            self._prune()
+
+    def update(self, items):
+        for item in items:
+            self.add(item)
+
+    def estimate(self, item):
+        return min(row[col] for row, col in zip(self.table, self._columns(item)))
+
+    def __getitem__(self, item):
+        return self.estimate(item)
+
+    def _prune(self):
+        ranked = sorted(self.candidates.items(), key=lambda kv: kv[1], reverse=True)
+        self.candidates = dict(ranked[:self.capacity])
+
+    def most_common(self, n):
+        """Return the `n` most frequent candidates as `(item, estimate)` pairs."""
+        ranked = sorted(self.candidates.items(), key=lambda kv: kv[1], reverse=True)
+        return ranked[:n]
+
+    def merge(self, other):
+        """Add the counts of `other` (built with the same shape) into this sketch."""
+        if (self.width, self.depth) != (other.width, other.depth):
+            raise ValueError("Cannot merge count-min sketches of different shapes")
+        for row, other_row in zip(self.table, other.table):
+            for col in range(self.width):
+                row[col] += other_row[col]
+        for item in set(self.candidates) | set(other.candidates):
+            self.candidates[item] = self.estimate(item)
+        if len(self.candidates) > self.capacity:
+            self._prune()
+        return self
+
+
+class HyperLogLog:
+    """Approximate distinct counter using 2**p one-byte registers.
+
+    The default `p=12` uses 4 KB and has a standard error of about 1.6%.
+    """
+
+    def __init__(self, p=12):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(self.m)
+
+    def add(self, item):
+        h = _hash64(item)
+        index = h & (self.m - 1)
+        rest = h >> self.p
+        # Position of the lowest set bit among the remaining 64 - p bits
+        rank = 1
+        while rank <= 64 - self.p and not rest & 1:
+            rest >>= 1
+            rank += 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, items):
+        for item in items:
+            self.add(item)
+
+    def __len__(self):
+        return int(round(self.count()))
+
+    def count(self):
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.m and zeros:
+            # Small range correction (linear counting)
+            estimate = self.m * math.log(self.m / zeros)
+        return estimate
+
+    def merge(self, other):
+        """Union `other` (built with the same `p`) into this counter."""
+        if self.p != other.p:
+            raise ValueError("Cannot merge HyperLogLog counters of different precision")
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+        return self
+
+    def union(self, other):
+        result = HyperLogLog(self.p)
+        result.registers = bytearray(self.registers)
+        return result.merge(other)
+
+
+class ClassStats:
+    """Per-label partial statistics accumulated in a single pass."""
+
+    def __init__(self, approximate=False):
+        self.approximate = approximate
+        self.documents = 0
+        self.tokens = 0
+        self.min_length = None
+        self.max_length = None
+        self.sample = None
+        if approximate:
+            self.words = HyperLogLog()
+            self.word_freq = CountMinSketch()
+        else:
+            self.words = set()
+            self.word_freq = Counter()
+
+    def add(self, tokens, text):
+        length = len(tokens)
+        self.documents += 1
+        self.tokens += length
+        if self.min_length is None or length < self.min_length:
+            self.min_length = length
+        if self.max_length is None or length > self.max_length:
+            self.max_length = length
+        if self.sample is None:
+            self.sample = text
+        self.words.update(tokens)
+        self.word_freq.update(tokens)
+
+    def merge(self, other):
+        self.documents += other.documents
+        self.tokens += other.tokens
+        for attr, pick in (('min_length', min), ('max_length', max)):
+            values = [v for v in (getattr(self, attr), getattr(other, attr)) if v is not None]
+            setattr(self, attr, pick(values) if values else None)
+        if self.sample is None:
+            self.sample = other.sample
+        if self.approximate:
+            self.words.merge(other.words)
+            self.word_freq.merge(other.word_freq)
+        else:
+            self.words.update(other.words)
+            self.word_freq.update(other.word_freq)
+        return self
+
+    def average_length(self):
+        return self.tokens / self.documents if self.documents else 0.0
+
+
+class DatasetStats:
+    """Mergeable summary of a labelled text dataset.
+
+    Call `add` for every record (or `add_record` with a dataset dict) and
+    `merge` to combine partial results computed over separate shards. Set
+    `approximate=True` to bound memory with sketches instead of exact
+    Counters and sets.
+    """
+
+    def __init__(self, approximate=False):
+        self.approximate = approximate
+        self.extractor = FeatureExtractor()
+        self.classes = {}
+
+    def _class(self, label):
+        if label not in self.classes:
+            self.classes[label] = ClassStats(self.approximate)
+        return self.classes[label]
+
+    def add(self, text, label):
+        self._class(label).add(self.extractor.tokenize(text), text)
+
+    def add_tokens(self, tokens, label):
+        """Add an already tokenized document, e.g. one served by `corpus_cache`."""
+        self._class(label).add(tokens, " ".join(tokens))
+
+    def add_record(self, record):
+        self.add(record['text'], record['label'])
+
+    def merge(self, other):
+        if self.approximate != other.approximate:
+            raise ValueError("Cannot merge exact and approximate statistics")
+        for label, stats in other.classes.items():
+            if label in self.classes:
+                self.classes[label].merge(stats)
+            else:
+                self.classes[label] = stats
+        return self
+
+    @property
+    def total(self):
+        return sum(stats.documents for stats in self.classes.values())
+
+    def get(self, label):
+        """Return the `ClassStats` for `label`, or empty stats if unseen."""
+        return self.classes.get(label) or ClassStats(self.approximate)
+
+    def vocabulary_overlap(self, label_a, label_b):
+        """Return `(total, only_a, only_b, common)` vocabulary sizes."""
+        words_a = self.get(label_a).words
+        words_b = self.get(label_b).words
+        if not self.approximate:
+            return (len(words_a | words_b), len(words_a - words_b),
+                    len(words_b - words_a), len(words_a & words_b))
+
+        # Inclusion-exclusion over the cardinality estimates
+        size_a = words_a.count()
+        size_b = words_b.count()
+        size_union = words_a.union(words_b).count()
+        common = max(0.0, size_a + size_b - size_union)
+        return (int(round(size_union)), int(round(max(0.0, size_union - size_b))),
+                int(round(max(0.0, size_union - size_a))), int(round(common)))
+
+    def top_words(self, label, n=15):
+        return self.get(label).word_freq.most_common(n)
+
+    def distinctive_words(self, label, other_label, min_count=3, limit=20):
+        """Return sorted words frequent in `label` that never occur in `other_label`.
+
+        In approximate mode only heavy-hitter candidates are considered; a
+        count-min estimate of zero guarantees the word is absent from the
+        other class.
+        """
+        stats = self.get(label)
+        other = self.get(other_label)
+        if self.approximate:
+            words = stats.word_freq.candidates
+        else:
+            words = stats.words - other.words
+        distinctive = [w for w in words
+                       if stats.word_freq[w] >= min_count and other.word_freq[w] == 0]
+        return sorted(distinctive)[:limit]
+
+
+def analyze_file(filepath, approximate=False):
+    """Build `DatasetStats` for one dataset file in a single streaming pass.
+
+    `filepath` may also be a corpus cache directory, in which case the
+    pre-tokenized documents are read from the memory-mapped arrays.
+    """
+    stats = DatasetStats(approximate)
+    if os.path.isdir(filepath):
+        cache = CorpusCache(filepath)
+        for tokens, label in zip(cache.documents(), cache.labels()):
+            stats.add_tokens(tokens, label)
+        return stats
+
+    for record in iter_dataset(filepath):
+        stats.add_record(record)
+    return stats
+
+
+def _analyze_shard(args):
+    return analyze_file(*args)
+
+
+def analyze_files(filepaths, approximate=False, processes=None):
+    """Analyse several dataset shards in parallel and merge the results."""
+    with Pool(processes) as pool:
+        partials = pool.map(_analyze_shard, [(path, approximate) for path in filepaths])
+
+    result = DatasetStats(approximate)
+    for partial in partials:
+        result.merge(partial)
+    return result
@@ -0,0 +1,216 @@
+"""
+vocab_store.py
+--------------
+Compact, array-backed replacement for the Python sets, dicts and lists that
+`FeatureExtractor` uses for its vocabularies.
+
+A `VocabularyStore` keeps its terms sorted and packed as UTF-8 into a single
+byte buffer with an offsets array, and optionally stores IDF values in a
+float64 array aligned with the terms (n-gram vocabularies have none). UTF-8
+byte order matches Python's string order, so positions agree with
+`sorted()`. An open-addressing hash table of positions (keyed by CRC-32)
+maps a term to its position, so no per-term Python objects are kept alive. Stores can be saved to a directory and loaded memory-mapped,
+which lets several worker processes share one read-only copy.
+"""
+
+import os
+import zlib
+
+import numpy as np
+
+
+class VocabularyStore:
+    """Sorted, immutable set of terms with an optional aligned IDF array.
+
+    Supports the lookups `FeatureExtractor` relies on: `len`, iteration in
+    sorted order, `in`, positional indexing and `find` / `index` to map a
+    term to its position. `idf` is None until IDF values are given or set.
+    """
+
+    def __init__(self, terms=(), idf=None):
+        encoded = sorted(set(term.encode('utf-8') for term in terms))
+        buffer = b"".join(encoded)
+        # uint32 offsets are enough for buffers under 4 GiB
+        dtype = np.uint32 if len(buffer) < 2 ** 32 else np.int64
+        offsets = np.zeros(len(encoded) + 1, dtype=dtype)
+        if encoded:
+            offsets[1:] = np.cumsum([len(term) for term in encoded])
+        self.buffer = np.frombuffer(buffer, dtype=np.uint8)
+        self.offsets = offsets
+        self._build_index()
+        self.idf = None
+        if idf:
+            values = np.zeros(len(encoded), dtype=np.float64)
+            for term, value in idf.items():
+                i = self.find(term)
+                if i >= 0:
+                    values[i] = value
+            self.idf = values
+
+    def _term_bytes(self, i):
+        return self.buffer[self.offsets[i]:self.offsets[i + 1]].tobytes()
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("vocabulary index out of range")
+        return self._term_bytes(index).decode('utf-8')
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._term_bytes(i).decode('utf-8')
+
+    def _build_index(self):
+        """Build the hash table mapping the CRC-32 of each term to its position.
+
+        Linear probing at a load factor of about 2/3; empty slots hold -1.
+        """
+        size = len(self) * 3 // 2 + 1
+        dtype = np.int32 if len(self) < 2 ** 31 else np.int64
+        table = np.full(size, -1, dtype=dtype)
+        for i in range(len(self)):
+            slot = zlib.crc32(self._term_bytes(i)) % size
+            while table[slot] >= 0:
+                slot = (slot + 1) % size
+            table[slot] = i
+        self.index_table = table
+
+    def find(self, term):
+        """Return the position of `term`, or -1 if it is not in the store."""
+        key = term.encode('utf-8')
+        # memoryviews index to plain ints without creating numpy scalars
+        table = memoryview(self.index_table)
+        buffer = memoryview(self.buffer)
+        offsets = memoryview(self.offsets)
+        size = len(table)
+        slot = zlib.crc32(key) % size
+        while True:
+            i = table[slot]
+            if i < 0:
+                return -1
+            if buffer[offsets[i]:offsets[i + 1]] == key:
+                return i
+            slot = (slot + 1) % size
+
+    def index(self, term):
+        i = self.find(term)
+        if i < 0:
+            raise ValueError("{!r} is not in the vocabulary".format(term))
+        return i
+
+    def __contains__(self, term):
+        return isinstance(term, str) and self.find(term) >= 0
+
+    def set_idf(self, values):
+        """Replace the IDF array with `values`, aligned with the sorted terms.
+
+        The new array is private to this process, so this also works on a
+        store loaded memory-mapped read-only.
+        """
+        idf = np.asarray(values, dtype=np.float64)
+        if idf.shape != (len(self),):
+            raise ValueError("expected {} IDF values, got {}".format(len(self), idf.shape[0]))
+        self.idf = idf
+
+    def _writable_idf(self):
+        # Copy-on-write: detach from a read-only memory map before modifying
+        if self.idf is None:
+            self.idf = np.zeros(len(self), dtype=np.float64)
+        elif not self.idf.flags.writeable:
+            self.idf = np.array(self.idf)
+        return self.idf
+
+    def idf_values(self):
+        """Return a dict-like view of the IDF array keyed by term."""
+        return IdfValues(self)
+
+    def nbytes(self):
+        """Total size of the backing arrays in bytes."""
+        idf_bytes = self.idf.nbytes if self.idf is not None else 0
+        return self.buffer.nbytes + self.offsets.nbytes + self.index_table.nbytes + idf_bytes
+
+    def save(self, directory):
+        """Write the store to `directory` as `.npy` arrays (`idf.npy` only if set)."""
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, 'buffer.npy'), self.buffer)
+        np.save(os.path.join(directory, 'offsets.npy'), self.offsets)
+        np.save(os.path.join(directory, 'index.npy'), self.index_table)
+        idf_path = os.path.join(directory, 'idf.npy')
+        if self.idf is not None:
+            np.save(idf_path, self.idf)
+        elif os.path.exists(idf_path):
+            os.remove(idf_path)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """Load a store saved with `save`.
+
+        With `mmap` (the default) the arrays are memory-mapped read-only, so
+        processes loading the same directory share pages. Recomputing IDF
+        values on such a store gives the process its own copy of the IDF
+        array; the terms stay shared.
+        """
+        mode = 'r' if mmap else None
+        store = cls.__new__(cls)
+        store.buffer = np.load(os.path.join(directory, 'buffer.npy'), mmap_mode=mode)
+        store.offsets = np.load(os.path.join(directory, 'offsets.npy'), mmap_mode=mode)
+        store.index_table = np.load(os.path.join(directory, 'index.npy'), mmap_mode=mode)
+        idf_path = os.path.join(directory, 'idf.npy')
+        store.idf = np.load(idf_path, mmap_mode=mode) if os.path.exists(idf_path) else None
+        return store
+
+
+class IdfValues:
+    """Dict-like access to a `VocabularyStore`'s IDF array.
+
+    Only terms in the store can be assigned. Like an empty dict, the view
+    has no entries until the store has an IDF array.
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def __getitem__(self, term):
+        i = self.store.find(term) if self.store.idf is not None else -1
+        if i < 0:
+            raise KeyError(term)
+        return float(self.store.idf[i])
+
+    def __setitem__(self, term, value):
+        i = self.store.find(term)
+        if i < 0:
+            raise KeyError(term)
+        self.store._writable_idf()[i] = value
+
+    def get(self, term, default=None):
+        i = self.store.find(term) if self.store.idf is not None else -1
+        if i < 0:
+            return default
+        return float(self.store.idf[i])
+
+    def __contains__(self, term):
+        return self.store.idf is not None and term in self.store
+
+    def __len__(self):
+        return len(self.store) if self.store.idf is not None else 0
+
+    def __iter__(self):
+        return self.keys()
+
+    def keys(self):
+        if self.store.idf is None:
+            return iter(())
+        return iter(self.store)
+
+    def items(self):
+        if self.store.idf is None:
+            return
+        for term, value in zip(self.store, self.store.idf.tolist()):
+            yield term, value
+